@@ -69,6 +69,41 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache compartilhado entre os processos do servidor (o LocMem padrão é por processo).
+# 'default' guarda a prévia da importação entre o upload e a confirmação e as sessions.
+# 'index' guarda os dados da tabela principal: muitas entradas de vida curta, num
+# cache separado para que o descarte (cull) do FileBasedCache ao chegar em
+# MAX_ENTRIES não apague prévias de importação pendentes.
+# Com REDIS_URL no .env usa Redis (requer o pacote `redis`); sem ela, arquivos em disco.
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'index': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'index',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache',
+        },
+        'index': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache_index',
+        },
+    }
+
+# Sessions lidas do cache; o banco fica como cópia persistente (write-through)
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # Limite de upload (para CSVs grandes)
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 
@@ -1,12 +1,36 @@
 from django.contrib import admin
+from .cache_index import invalidar_index_apos_commit
 from .models import Colaborador, PeriodoAquisitivo, ParcelaFerias, ImportacaoProvisao
 
 
+class InvalidaIndexMixin:
+    """
+    Invalida o cache do index uma vez por gravação no admin (após o commit).
+    save_related roda uma vez por formulário salvo, depois do objeto e dos inlines.
+    """
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        invalidar_index_apos_commit()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidar_index_apos_commit()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        invalidar_index_apos_commit()
+
+
 class ParcelaInline(admin.TabularInline):
     model = ParcelaFerias
     extra = 1
     fields = ['mes_ferias', 'dias', 'observacao']
 
+    def get_queryset(self, request):
+        # __str__ da parcela desce até periodo.colaborador — evita 2 queries por linha
+        return super().get_queryset(request).select_related('periodo__colaborador')
+
 
 class PeriodoInline(admin.TabularInline):
     model = PeriodoAquisitivo
@@ -15,9 +39,13 @@ class PeriodoInline(admin.TabularInline):
     readonly_fields = ['inicio_aquisitivo', 'fim_aquisitivo', 'limite_maximo', 'dias_direito']
     show_change_link = True
 
+    def get_queryset(self, request):
+        # __str__ do período usa colaborador.nome — um JOIN em vez de 1 query por linha
+        return super().get_queryset(request).select_related('colaborador')
+
 
 @admin.register(Colaborador)
-class ColaboradorAdmin(admin.ModelAdmin):
+class ColaboradorAdmin(InvalidaIndexMixin, admin.ModelAdmin):
     list_display = ['codigo', 'nome', 'cargo', 'empresa', 'data_admissao', 'ativo']
     list_filter = ['ativo', 'empresa']
     search_fields = ['nome', 'codigo', 'cargo']
@@ -25,18 +53,26 @@ class ColaboradorAdmin(admin.ModelAdmin):
 
 
 @admin.register(PeriodoAquisitivo)
-class PeriodoAdmin(admin.ModelAdmin):
+class PeriodoAdmin(InvalidaIndexMixin, admin.ModelAdmin):
     list_display = ['colaborador', 'inicio_aquisitivo', 'fim_aquisitivo', 'limite_maximo', 'dias_direito']
     search_fields = ['colaborador__nome', 'colaborador__codigo']
     inlines = [ParcelaInline]
 
+    def get_queryset(self, request):
+        # Lista, edição e exclusão mostram o __str__ (colaborador.nome) — um JOIN só
+        return super().get_queryset(request).select_related('colaborador')
+
 
 @admin.register(ParcelaFerias)
-class ParcelaAdmin(admin.ModelAdmin):
+class ParcelaAdmin(InvalidaIndexMixin, admin.ModelAdmin):
     list_display = ['periodo', 'mes_ferias', 'dias', 'observacao']
     search_fields = ['periodo__colaborador__nome', 'mes_ferias']
     list_filter = ['mes_ferias']
 
+    def get_queryset(self, request):
+        # __str__ da parcela desce até periodo.colaborador em todas as telas
+        return super().get_queryset(request).select_related('periodo__colaborador')
+
 
 @admin.register(ImportacaoProvisao)
 class ImportacaoAdmin(admin.ModelAdmin):
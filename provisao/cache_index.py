@@ -0,0 +1,43 @@
+"""
+Invalidação do cache da tela principal (index).
+
+Os dados da tabela ficam no cache 'index' sob uma "versão" guardada nele mesmo;
+cada caminho que grava nos modelos exibidos (AJAX das parcelas, importação,
+admin) troca a versão uma vez, e as entradas antigas simplesmente deixam
+de ser lidas (expiram sozinhas).
+
+Não usa sinais post_save/post_delete de propósito: um receiver de post_delete
+desliga o delete em cascata rápido do Django e dispararia uma invalidação por
+objeto removido.
+"""
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+
+INDEX_VERSAO_KEY = 'provisao:index:versao'
+
+
+def _nova_versao():
+    # Token aleatório, nunca um contador: se a chave da versão for despejada do
+    # cache, a recriada não coincide com a de entradas antigas ainda vivas
+    return uuid.uuid4().hex
+
+
+def versao_index():
+    """Versão atual dos dados do index (cria na primeira chamada)."""
+    return caches['index'].get_or_set(INDEX_VERSAO_KEY, _nova_versao, timeout=None)
+
+
+def invalidar_index():
+    """Troca a versão: as próximas requisições recalculam a tabela."""
+    caches['index'].set(INDEX_VERSAO_KEY, _nova_versao(), timeout=None)
+
+
+def invalidar_index_apos_commit():
+    """
+    Agenda invalidar_index() para depois do COMMIT da transação atual (ou roda
+    na hora, fora de transação). Invalidar antes do commit deixaria uma
+    requisição concorrente guardar os dados antigos já sob a versão nova.
+    """
+    transaction.on_commit(invalidar_index)
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-15 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('provisao', '0002_remove_periodoaquisitivo_mes_ferias_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='colaborador',
+            index=models.Index(fields=['ativo', 'empresa'], name='colab_ativo_empresa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='colaborador',
+            index=models.Index(fields=['empresa'], name='colab_empresa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parcelaferias',
+            index=models.Index(fields=['mes_ferias'], name='parcela_mes_ferias_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='periodoaquisitivo',
+            index=models.Index(fields=['limite_maximo'], name='periodo_limite_maximo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='periodoaquisitivo',
+            index=models.Index(fields=['limite_ideal'], name='periodo_limite_ideal_idx'),
+        ),
+    ]
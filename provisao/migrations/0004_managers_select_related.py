@@ -0,0 +1,21 @@
+# Generated by Django 6.0.2 on 2026-10-15 17:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('provisao', '0003_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='parcelaferias',
+            options={'base_manager_name': 'objects', 'ordering': ['mes_ferias'], 'verbose_name': 'Parcela de Férias', 'verbose_name_plural': 'Parcelas de Férias'},
+        ),
+        migrations.AlterModelOptions(
+            name='periodoaquisitivo',
+            options={'base_manager_name': 'objects', 'ordering': ['colaborador__nome', 'inicio_aquisitivo'], 'verbose_name': 'Período Aquisitivo', 'verbose_name_plural': 'Períodos Aquisitivos'},
+        ),
+    ]
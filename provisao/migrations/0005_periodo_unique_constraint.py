@@ -0,0 +1,21 @@
+# Generated by Django 6.0.2 on 2026-10-15 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('provisao', '0004_managers_select_related'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='periodoaquisitivo',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='periodoaquisitivo',
+            constraint=models.UniqueConstraint(fields=('colaborador', 'inicio_aquisitivo'), name='uniq_colab_inicio'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-15 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('provisao', '0005_periodo_unique_constraint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='importacaoprovisao',
+            index=models.Index(fields=['-data_importacao'], name='importacao_data_desc_idx'),
+        ),
+    ]
@@ -1,7 +1,32 @@
+from datetime import timedelta
+from decimal import Decimal
+from functools import cached_property
+
 from django.db import models
+from django.db.models import Case, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 
+# Janela (em dias até o limite máximo) para os status de prazo
+DIAS_URGENTE = 60
+DIAS_ATENCAO = 90
+
+# Status de prazo → (classe_bootstrap, texto) do badge
+STATUS_BADGES = {
+    'danger':   ('bg-danger',             '⚠ URGENTE'),
+    'warning':  ('bg-warning text-dark',  '⏰ Atenção'),
+    'ok':       ('bg-success',            '✓ OK'),
+    'sem_dias': ('bg-secondary',          '— Sem dias'),
+}
+_BADGE_PADRAO = ('bg-secondary', '-')
+
+
+def badge_do_status(status):
+    """Retorna (classe_bootstrap, texto) do badge para um status de prazo."""
+    return STATUS_BADGES.get(status, _BADGE_PADRAO)
+
+
 class Colaborador(models.Model):
     """Representa um funcionário da empresa."""
     codigo = models.CharField(max_length=20, unique=True, verbose_name='Código')
@@ -15,11 +40,48 @@ class Colaborador(models.Model):
         ordering = ['nome']
         verbose_name = 'Colaborador'
         verbose_name_plural = 'Colaboradores'
+        indexes = [
+            # (ativo, empresa) também atende filtros só por ativo (prefixo do índice)
+            models.Index(fields=['ativo', 'empresa'], name='colab_ativo_empresa_idx'),
+            models.Index(fields=['empresa'], name='colab_empresa_idx'),
+        ]
 
     def __str__(self):
         return f"{self.codigo} - {self.nome}"
 
 
+class PeriodoQuerySet(models.QuerySet):
+
+    def com_status(self, hoje=None):
+        """
+        Anota `status_calc` com a mesma regra de PeriodoAquisitivo.calcular_status,
+        só que calculada pelo banco dentro do próprio SELECT — sem iterar parcelas
+        nem chamar timezone.now() por linha em Python.
+        """
+        if hoje is None:
+            hoje = timezone.now().date()
+
+        dias_agendados = Subquery(
+            ParcelaFerias.objects
+            .filter(periodo=OuterRef('pk'))
+            .order_by()
+            .values('periodo')
+            .annotate(total=Sum('dias'))
+            .values('total'),
+            output_field=models.DecimalField(max_digits=5, decimal_places=1),
+        )
+
+        return self.annotate(status_calc=Case(
+            When(Q(dias_direito__isnull=True) | Q(dias_direito=0), then=Value('sem_dias')),
+            When(dias_direito__lte=Coalesce(dias_agendados, Value(Decimal('0'))), then=Value('ok')),
+            When(limite_maximo__isnull=True, then=Value('ok')),
+            When(limite_maximo__lte=hoje + timedelta(days=DIAS_URGENTE), then=Value('danger')),
+            When(limite_maximo__lte=hoje + timedelta(days=DIAS_ATENCAO), then=Value('warning')),
+            default=Value('ok'),
+            output_field=models.CharField(),
+        ))
+
+
 class PeriodoAquisitivo(models.Model):
     """
     Cada colaborador pode ter múltiplos períodos aquisitivos vindos do ERP.
@@ -43,55 +105,101 @@ class PeriodoAquisitivo(models.Model):
     dias_restantes = models.DecimalField(max_digits=5, decimal_places=1, default=0, verbose_name='Dias Restantes')
     dias_programados = models.DecimalField(max_digits=5, decimal_places=1, default=0, verbose_name='Dias Programados')
 
+    objects = PeriodoQuerySet.as_manager()
+
     class Meta:
         ordering = ['colaborador__nome', 'inicio_aquisitivo']
         verbose_name = 'Período Aquisitivo'
         verbose_name_plural = 'Períodos Aquisitivos'
-        unique_together = ['colaborador', 'inicio_aquisitivo']
+        constraints = [
+            models.UniqueConstraint(fields=['colaborador', 'inicio_aquisitivo'], name='uniq_colab_inicio'),
+        ]
+        indexes = [
+            models.Index(fields=['limite_maximo'], name='periodo_limite_maximo_idx'),
+            models.Index(fields=['limite_ideal'], name='periodo_limite_ideal_idx'),
+        ]
 
     def __str__(self):
         return f"{self.colaborador.nome} | {self.inicio_aquisitivo} → {self.fim_aquisitivo}"
 
-    @property
-    def status_limite(self):
+    def calcular_status(self, hoje=None, dias_agendados=None):
         """
         Status baseado no limite_maximo e nos dias agendados.
         Badge só aparece quando os dias de direito NÃO estão totalmente agendados.
-        - 'danger'   → limite máximo em ≤ 60 dias
-        - 'warning'  → limite máximo em ≤ 90 dias
+        - 'danger'   → limite máximo em ≤ DIAS_URGENTE (60) dias
+        - 'warning'  → limite máximo em ≤ DIAS_ATENCAO (90) dias
         - 'ok'       → dentro do prazo ou férias completamente agendadas
         - 'sem_dias' → sem dias de direito
+
+        `hoje` pode ser passado pela view para calcular a data uma vez só por request.
+        `dias_agendados` idem, quando a view já totalizou as parcelas (evita
+        percorrer self.parcelas de novo).
+        Para listagens, prefira PeriodoAquisitivo.objects.com_status(), que faz
+        a mesma conta no banco.
         """
         if not self.dias_direito or self.dias_direito == 0:
             return 'sem_dias'
 
         # Se todos os dias de direito já estão agendados, não há alerta
-        dias_agendados = sum(p.dias for p in self.parcelas.all() if p.dias is not None)
+        if dias_agendados is None:
+            dias_agendados = sum(p.dias for p in self.parcelas.all() if p.dias is not None)
         if dias_agendados >= self.dias_direito:
             return 'ok'
 
         if not self.limite_maximo:
             return 'ok'
 
-        dias_para_limite = (self.limite_maximo - timezone.now().date()).days
+        if hoje is None:
+            hoje = timezone.now().date()
+        dias_para_limite = (self.limite_maximo - hoje).days
 
-        if dias_para_limite <= 60:
+        if dias_para_limite <= DIAS_URGENTE:
             return 'danger'
-        if dias_para_limite <= 90:
+        if dias_para_limite <= DIAS_ATENCAO:
             return 'warning'
 
         return 'ok'
 
-    @property
+    @cached_property
+    def status_limite(self):
+        """Status de prazo do período (ver calcular_status), calculado uma vez por instância."""
+        return self.calcular_status()
+
+    @cached_property
     def status_badge(self):
         """Retorna (classe_bootstrap, texto) para o badge de status."""
-        badges = {
-            'danger':   ('bg-danger',             '⚠ URGENTE'),
-            'warning':  ('bg-warning text-dark',  '⏰ Atenção'),
-            'ok':       ('bg-success',            '✓ OK'),
-            'sem_dias': ('bg-secondary',          '— Sem dias'),
-        }
-        return badges.get(self.status_limite, ('bg-secondary', '-'))
+        return badge_do_status(self.status_limite)
+
+
+_MESES = ('Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez')
+
+
+def formatar_mes_ferias(mes):
+    """Retorna 'Jul/2025' a partir de '2025-07'. Fora do formato, devolve o valor como veio."""
+    if mes and len(mes) == 7 and mes[4] == '-':
+        mes_num = mes[5:7]
+        if mes_num.isdigit() and '01' <= mes_num <= '12':
+            return f"{_MESES[int(mes_num) - 1]}/{mes[:4]}"
+    return mes
+
+
+def _fmt_dias(dias):
+    """Dias da parcela como string para o JSON; '' quando não informado."""
+    return '' if dias is None else str(dias)
+
+
+def parcela_para_dict(id, mes_ferias, dias, observacao):
+    """
+    Formato JSON de uma parcela (respostas AJAX e data-parcelas da tabela).
+    Recebe os valores soltos para servir tanto a instâncias quanto a linhas de .values().
+    """
+    return {
+        'id': id,
+        'mes_ferias': mes_ferias,
+        'mes_ferias_display': formatar_mes_ferias(mes_ferias),
+        'dias': _fmt_dias(dias),
+        'observacao': observacao,
+    }
 
 
 class ParcelaFerias(models.Model):
@@ -116,6 +224,9 @@ class ParcelaFerias(models.Model):
         ordering = ['mes_ferias']
         verbose_name = 'Parcela de Férias'
         verbose_name_plural = 'Parcelas de Férias'
+        indexes = [
+            models.Index(fields=['mes_ferias'], name='parcela_mes_ferias_idx'),
+        ]
 
     def __str__(self):
         return f"{self.periodo} → {self.mes_ferias_display}"
@@ -123,22 +234,11 @@ class ParcelaFerias(models.Model):
     @property
     def mes_ferias_display(self):
         """Retorna 'Jul/2025' a partir de '2025-07'."""
-        try:
-            ano, mes = self.mes_ferias.split('-')
-            nomes = ['Jan','Fev','Mar','Abr','Mai','Jun','Jul','Ago','Set','Out','Nov','Dez']
-            return f"{nomes[int(mes)-1]}/{ano}"
-        except Exception:
-            return self.mes_ferias
+        return formatar_mes_ferias(self.mes_ferias)
 
     def to_dict(self):
         """Serializa para JSON (usado nas respostas AJAX do modal)."""
-        return {
-            'id': self.id,
-            'mes_ferias': self.mes_ferias,
-            'mes_ferias_display': self.mes_ferias_display,
-            'dias': str(self.dias) if self.dias else '',
-            'observacao': self.observacao,
-        }
+        return parcela_para_dict(self.id, self.mes_ferias, self.dias, self.observacao)
 
 
 class ImportacaoProvisao(models.Model):
@@ -153,6 +253,10 @@ class ImportacaoProvisao(models.Model):
     class Meta:
         ordering = ['-data_importacao']
         verbose_name = 'Importação de Provisão'
+        indexes = [
+            # Mesma direção do ordering: .first() e o admin leem o índice sem ordenar
+            models.Index(fields=['-data_importacao'], name='importacao_data_desc_idx'),
+        ]
 
     def __str__(self):
         return f"Importação {self.data_importacao.strftime('%d/%m/%Y %H:%M')}"
\ No newline at end of file
@@ -1,17 +1,14 @@
-import json
 from django import template
 
+from provisao.models import badge_do_status
+
 register = template.Library()
 
 
 @register.filter
-def jsonparcelas(parcelas_qs):
+def status_badge(status):
     """
-    Serializa um queryset de ParcelaFerias para JSON inline no HTML.
-    Uso: {{ periodo.parcelas.all|jsonparcelas }}
-    Retorna string JSON escapada para uso seguro em data-attributes.
+    Converte o status de prazo (ex: periodo.status_calc) em (classe_bootstrap, texto).
+    Uso: {% with badge=periodo.status_calc|status_badge %}
     """
-    dados = [p.to_dict() for p in parcelas_qs]
-    # mark_safe não é necessário pois usamos no atributo data-, mas precisamos
-    # de aspas simples no HTML para o JSON funcionar com aspas duplas internas.
-    return json.dumps(dados, ensure_ascii=False)
\ No newline at end of file
+    return badge_do_status(status)
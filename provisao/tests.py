@@ -1,3 +1,146 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Colaborador, ParcelaFerias, PeriodoAquisitivo
+from .utils import LinhaCSV, aplicar_importacao
+
+
+class StatusPeriodoTests(TestCase):
+    """
+    PeriodoQuerySet.com_status (SQL, usado no index) precisa dar sempre o mesmo
+    resultado que PeriodoAquisitivo.calcular_status (Python, usado no AJAX).
+    """
+
+    hoje = date(2026, 1, 15)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.colaborador = Colaborador.objects.create(codigo='1', nome='ANA', cargo='Caixa')
+        cls.inicio = date(2020, 1, 1)
+
+    def criar_periodo(self, dias_direito=Decimal('30'), limite_maximo=None, parcelas=()):
+        """Cria um período (cada um com início distinto) e suas parcelas (lista de dias)."""
+        periodo = PeriodoAquisitivo.objects.create(
+            colaborador=self.colaborador,
+            inicio_aquisitivo=self.inicio,
+            fim_aquisitivo=self.inicio + timedelta(days=364),
+            limite_maximo=limite_maximo,
+            dias_direito=dias_direito,
+        )
+        self.inicio += timedelta(days=365)
+        for i, dias in enumerate(parcelas, start=1):
+            ParcelaFerias.objects.create(periodo=periodo, mes_ferias=f'2026-{i:02d}', dias=dias)
+        return periodo
+
+    def assertStatus(self, periodo, esperado):
+        sql = PeriodoAquisitivo.objects.com_status(self.hoje).get(pk=periodo.pk).status_calc
+        python = PeriodoAquisitivo.objects.get(pk=periodo.pk).calcular_status(self.hoje)
+        self.assertEqual(sql, python)
+        self.assertEqual(sql, esperado)
+
+    def test_sem_dias_de_direito(self):
+        perto = self.hoje + timedelta(days=10)
+        self.assertStatus(self.criar_periodo(dias_direito=Decimal('0'), limite_maximo=perto), 'sem_dias')
+
+    def test_dias_direito_none(self):
+        # A coluna é NOT NULL, então None só existe em instância não salva;
+        # calcular_status trata igual ao 0 (mesmo ramo 'sem_dias' do SQL)
+        periodo = PeriodoAquisitivo(dias_direito=None, limite_maximo=self.hoje)
+        self.assertEqual(periodo.calcular_status(self.hoje, dias_agendados=0), 'sem_dias')
+
+    def test_parcelas_sem_dias_nao_somam(self):
+        perto = self.hoje + timedelta(days=10)
+        self.assertStatus(self.criar_periodo(limite_maximo=perto, parcelas=[None, None]), 'danger')
+        self.assertStatus(self.criar_periodo(limite_maximo=perto, parcelas=[None, Decimal('10')]), 'danger')
+
+    def test_totalmente_agendado(self):
+        perto = self.hoje + timedelta(days=10)
+        self.assertStatus(self.criar_periodo(limite_maximo=perto, parcelas=[Decimal('10'), Decimal('20')]), 'ok')
+        self.assertStatus(self.criar_periodo(limite_maximo=perto, parcelas=[Decimal('20'), Decimal('20')]), 'ok')
+        self.assertStatus(self.criar_periodo(limite_maximo=perto, parcelas=[Decimal('29.5')]), 'danger')
+
+    def test_sem_limite_maximo(self):
+        self.assertStatus(self.criar_periodo(limite_maximo=None), 'ok')
+        self.assertStatus(self.criar_periodo(limite_maximo=None, parcelas=[Decimal('10')]), 'ok')
+
+    def test_fronteiras_de_60_e_90_dias(self):
+        casos = [
+            (-5, 'danger'),  # limite já vencido
+            (60, 'danger'),
+            (61, 'warning'),
+            (90, 'warning'),
+            (91, 'ok'),
+        ]
+        for dias, esperado in casos:
+            with self.subTest(dias=dias):
+                limite = self.hoje + timedelta(days=dias)
+                self.assertStatus(self.criar_periodo(limite_maximo=limite), esperado)
+
+
+def linha_csv(codigo, inicio, nome='ANA', faltas='0', dias_direito='30'):
+    """LinhaCSV mínima, como sai de processar_csv."""
+    return LinhaCSV(
+        empresa='001 - RN - MATRIZ', codigo=codigo, nome=nome, cargo='Caixa',
+        data_admissao=date(2019, 1, 1), inicio_aquisitivo=inicio,
+        fim_aquisitivo=inicio + timedelta(days=364), limite_ideal=None, limite_maximo=None,
+        faltas=faltas, dias_direito=dias_direito, dias_gozo='0',
+        dias_restantes=dias_direito, dias_programados='0',
+    )
+
+
+class AplicarImportacaoTests(TestCase):
+
+    def test_reimportacao_atualiza_periodos_no_lugar(self):
+        inicio_1, inicio_2 = date(2024, 1, 1), date(2025, 1, 1)
+        importacao = aplicar_importacao(
+            [linha_csv('10', inicio_1), linha_csv('10', inicio_2)],
+            adicionar_novos=True, remover_antigos=False,
+        )
+        # Colaborador novo com duas linhas conta uma vez só
+        self.assertEqual((importacao.novos, importacao.atualizados), (1, 0))
+
+        periodo = PeriodoAquisitivo.objects.get(colaborador__codigo='10', inicio_aquisitivo=inicio_1)
+        parcela = ParcelaFerias.objects.create(periodo=periodo, mes_ferias='2025-07', dias=Decimal('10'))
+
+        importacao = aplicar_importacao(
+            [
+                linha_csv('10', inicio_1, faltas='2'),
+                linha_csv('10', inicio_2),
+                linha_csv('10', inicio_1, faltas='3.5'),  # mesma chave: a última linha vence
+            ],
+            adicionar_novos=True, remover_antigos=False,
+        )
+        # +1 por linha de colaborador existente e +1 por linha de período existente
+        self.assertEqual((importacao.novos, importacao.atualizados), (0, 6))
+
+        self.assertEqual(PeriodoAquisitivo.objects.filter(colaborador__codigo='10').count(), 2)
+        atualizado = PeriodoAquisitivo.objects.get(pk=periodo.pk)
+        self.assertEqual(atualizado.faltas, Decimal('3.5'))
+        self.assertEqual(list(atualizado.parcelas.all()), [parcela])
+
+    def test_novo_sem_adicionar_novos_fica_inativo_e_sem_periodos(self):
+        importacao = aplicar_importacao(
+            [linha_csv('20', date(2024, 1, 1), nome='BRUNO')],
+            adicionar_novos=False, remover_antigos=False,
+        )
+        colaborador = Colaborador.objects.get(codigo='20')
+        self.assertFalse(colaborador.ativo)
+        self.assertFalse(colaborador.periodos.exists())
+        self.assertEqual(importacao.novos, 0)
+
+    def test_remover_antigos_conta_os_inativados(self):
+        for codigo in ['30', '31', '32']:
+            Colaborador.objects.create(codigo=codigo, nome=f'C{codigo}', cargo='Caixa')
+        Colaborador.objects.create(codigo='33', nome='C33', cargo='Caixa', ativo=False)
+
+        importacao = aplicar_importacao(
+            [linha_csv('30', date(2024, 1, 1))],
+            adicionar_novos=True, remover_antigos=True,
+        )
+        self.assertEqual(importacao.removidos, 2)
+        self.assertEqual(
+            set(Colaborador.objects.filter(ativo=True).values_list('codigo', flat=True)),
+            {'30'},
+        )
@@ -4,10 +4,11 @@ Lida com as peculiaridades do formato: linhas sem código (continuação do cola
 datas em formato numérico Excel (serial), e campos decimais com vírgula.
 """
 import csv
-import io
 import re
+from collections import namedtuple
 from datetime import date, datetime, timedelta
-from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from itertools import chain
 
 
 # Mapa: código da empresa (3 dígitos) → nome sintético
@@ -84,7 +85,9 @@ def sintetizar_empresa(empresa_raw):
     Ex: '001 - RN TINTAS E FERR. LTDA - MATRIZ' → '001 - RN - MATRIZ'
     Se não encontrar no mapa, retorna o código + ' - RN - ???' para não perder a info.
     """
-    codigo = str(empresa_raw).strip()[:3]
+    if not isinstance(empresa_raw, str):
+        empresa_raw = str(empresa_raw)
+    codigo = empresa_raw.strip()[:3]
     return _EMPRESA_MAP.get(codigo, f"{codigo} - RN - ???")
 
 
@@ -100,6 +103,26 @@ _CARGO_PREFIXOS = [
 ]
 
 
+def _indexar_por_primeira_palavra(prefixos):
+    """
+    Índice pela primeira palavra: cada cargo só é comparado com os prefixos
+    que podem casar, em vez de varrer a lista inteira.
+    Guarda também o prefixo com espaço já concatenado.
+    """
+    indice = {}
+    for prefixo, canonico in prefixos:
+        indice.setdefault(prefixo.split(' ', 1)[0], []).append(
+            (prefixo, prefixo + ' ', canonico)
+        )
+    return indice
+
+
+_CARGO_POR_PALAVRA = _indexar_por_primeira_palavra(_CARGO_PREFIXOS)
+
+# Sufixo de nível/patente: ' II', ' IV', ' G1 - I', ...
+_CARGO_SUFIXO_RE = re.compile(r'\s+(G\d+\s*[-–]\s*)?(I{1,4}|IV|VI{0,3}|IX)\s*$')
+
+
 def sintetizar_cargo(cargo_raw):
     """
     Normaliza o cargo em dois passos:
@@ -110,16 +133,12 @@ def sintetizar_cargo(cargo_raw):
     em múltiplas opções para o mesmo tipo de função.
     """
     # Passo 1: remove sufixo numérico/romano
-    sem_sufixo = re.sub(
-        r'\s+(G\d+\s*[-–]\s*)?(I{1,4}|IV|VI{0,3}|IX)\s*$',
-        '',
-        cargo_raw.strip()
-    )
+    sem_sufixo = _CARGO_SUFIXO_RE.sub('', cargo_raw.strip())
 
-    # Passo 2: agrupa por prefixo canônico
+    # Passo 2: agrupa por prefixo canônico (só os que começam com a mesma palavra)
     upper = sem_sufixo.upper()
-    for prefixo, canonico in _CARGO_PREFIXOS:
-        if upper == prefixo or upper.startswith(prefixo + ' '):
+    for prefixo, prefixo_espaco, canonico in _CARGO_POR_PALAVRA.get(upper.partition(' ')[0], ()):
+        if upper == prefixo or upper.startswith(prefixo_espaco):
             return canonico
 
     # Sem match: título capitalizado (ex: "CAIXA" → "Caixa")
@@ -142,86 +161,143 @@ def excel_serial_para_data(serial):
 def parse_data(valor):
     """
     Tenta converter string para date.
-    Aceita: DD/MM/YYYY, YYYY-MM-DD, ou número serial do Excel.
+    Aceita: DD/MM/YYYY, YYYY-MM-DD, DD-MM-YYYY ou número serial do Excel.
     """
-    if not valor or str(valor).strip() in ('', '0'):
+    if not valor:
         return None
+    if not isinstance(valor, str):
+        valor = str(valor)
+    return _parse_data_str(valor.strip())
 
-    valor = str(valor).strip()
 
-    if valor.isdigit() and len(valor) == 5:
-        return excel_serial_para_data(valor)
+@lru_cache(maxsize=8192)
+def _parse_data_str(valor):
+    """
+    Decide o formato pelo separador em vez de tentar cada strptime em sequência.
+    Cacheado: admissão e início/fim de período se repetem muito entre linhas.
+    """
+    if valor in ('', '0'):
+        return None
 
-    for fmt in ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y'):
+    if '/' in valor:
         try:
-            return datetime.strptime(valor, fmt).date()
+            return datetime.strptime(valor, '%d/%m/%Y').date()
         except ValueError:
-            continue
+            return None
+
+    if '-' in valor:
+        partes = valor.split('-')
+        if len(partes) != 3:
+            return None
+        try:
+            if len(partes[0]) == 4:                       # YYYY-MM-DD
+                return date(int(partes[0]), int(partes[1]), int(partes[2]))
+            if len(partes[2]) == 4:                       # DD-MM-YYYY
+                return date(int(partes[2]), int(partes[1]), int(partes[0]))
+        except ValueError:
+            pass
+        return None
+
+    if valor.isdigit() and len(valor) == 5:
+        return excel_serial_para_data(valor)
 
     return None
 
 
-def parse_decimal(valor):
-    """Converte string com vírgula ou ponto para Decimal."""
-    if not valor or str(valor).strip() == '':
-        return Decimal('0')
-    try:
-        return Decimal(str(valor).strip().replace(',', '.'))
-    except InvalidOperation:
-        return Decimal('0')
+# Número já normalizado (ponto decimal): '30', '2.5', '-1', '.5'
+_NUMERO_RE = re.compile(r'^[-+]?(\d+(\.\d*)?|\.\d+)$')
+
+
+def parse_decimal_str(valor):
+    """
+    Normaliza número com vírgula ou ponto para string com ponto ('30,0' → '30.0').
+    Valor vazio ou inválido vira '0'. Não constrói Decimal: a string segue na
+    prévia da importação e o DecimalField a converte só na hora de gravar no banco.
+    """
+    if not valor:
+        return '0'
+    valor = valor.strip().replace(',', '.')
+    return valor if _NUMERO_RE.match(valor) else '0'
+
+
+# Uma linha (período) do CSV já normalizada. Tupla nomeada em vez de dict:
+# ocupa menos no cache da importação e o acesso é por atributo.
+LinhaCSV = namedtuple('LinhaCSV', [
+    'empresa', 'codigo', 'nome', 'cargo', 'data_admissao',
+    'inicio_aquisitivo', 'fim_aquisitivo', 'limite_ideal', 'limite_maximo',
+    'faltas', 'dias_direito', 'dias_gozo', 'dias_restantes', 'dias_programados',
+])
 
 
-def processar_csv(arquivo_texto):
+def processar_csv(arquivo):
     """
-    Processa o conteúdo do CSV exportado do ERP.
+    Processa o CSV exportado do ERP a partir de qualquer iterável de linhas de
+    texto: arquivo aberto em modo texto, StringIO, lista de str... Não precisa
+    de seek, então serve também para streams de upload.
 
-    Retorna lista de dicts prontos para salvar na session (sem objetos date/Decimal —
-    tudo convertido para str/None para ser serializável em JSON).
+    É um gerador: lê e devolve uma linha por vez, sem carregar o arquivo inteiro
+    na memória. Quem precisar percorrer mais de uma vez materializa com list().
+
+    Cada item é uma LinhaCSV com as datas já como date (ou None) e os números
+    como string normalizada — convertida uma única vez aqui, pronta para ir ao
+    cache da importação (pickle) e ser gravada sem novo parsing.
 
     Peculiaridade do ERP: quando um colaborador tem dois períodos aquisitivos,
     a segunda linha vem sem código/nome/cargo/empresa — preenche da linha anterior.
     """
-    linhas = []
     ultimo_codigo   = ''
     ultimo_nome     = ''
     ultimo_cargo    = ''
     ultima_empresa  = ''
     ultima_admissao = None
 
-    amostra     = arquivo_texto[:2000]
+    # Espia as primeiras linhas (~2000 caracteres) só para descobrir o
+    # delimitador e depois as devolve ao início do fluxo
+    arquivo = iter(arquivo)
+    espiadas, tamanho = [], 0
+    for texto in arquivo:
+        espiadas.append(texto)
+        tamanho += len(texto)
+        if tamanho >= 2000:
+            break
+    amostra     = ''.join(espiadas)
     delimitador = '\t' if '\t' in amostra else ';' if amostra.count(';') > amostra.count(',') else ','
 
-    reader = csv.reader(io.StringIO(arquivo_texto), delimiter=delimitador)
+    reader = csv.reader(chain(espiadas, arquivo), delimiter=delimitador)
+
+    # Aliases locais: evitam a busca no escopo global a cada célula do laço
+    _parse_data = parse_data
+    _parse_num  = parse_decimal_str
 
     cabecalho_encontrado = False
     for linha in reader:
         if not any(linha):
             continue
 
+        # Um único upper() da linha inteira em vez de um por célula
         if not cabecalho_encontrado:
-            linha_upper = [c.upper().strip() for c in linha]
-            if any('FUNCION' in c for c in linha_upper):
+            if 'FUNCION' in '|'.join(linha).upper():
                 cabecalho_encontrado = True
             continue
 
-        while len(linha) < 15:
-            linha.append('')
-
-        # Lê os campos brutos
-        empresa_raw      = str(linha[0]).strip()
-        codigo           = str(linha[1]).strip()
-        nome             = str(linha[2]).strip()
-        cargo_raw        = str(linha[3]).strip()
-        data_admissao    = parse_data(linha[4])
-        inicio_aq        = parse_data(linha[5])
-        fim_aq           = parse_data(linha[6])
-        limite_ideal     = parse_data(linha[7])
-        limite_maximo    = parse_data(linha[8])
-        faltas           = parse_decimal(linha[9])
-        dias_direito     = parse_decimal(linha[10])
-        dias_gozo        = parse_decimal(linha[11])
-        dias_restantes   = parse_decimal(linha[12])
-        dias_programados = parse_decimal(linha[13])
+        if len(linha) < 15:
+            linha += [''] * (15 - len(linha))
+
+        # Lê os campos brutos (csv.reader já entrega str)
+        empresa_raw      = linha[0].strip()
+        codigo           = linha[1].strip()
+        nome             = linha[2].strip()
+        cargo_raw        = linha[3].strip()
+        data_admissao    = _parse_data(linha[4])
+        inicio_aq        = _parse_data(linha[5])
+        fim_aq           = _parse_data(linha[6])
+        limite_ideal     = _parse_data(linha[7])
+        limite_maximo    = _parse_data(linha[8])
+        faltas           = _parse_num(linha[9])
+        dias_direito     = _parse_num(linha[10])
+        dias_gozo        = _parse_num(linha[11])
+        dias_restantes   = _parse_num(linha[12])
+        dias_programados = _parse_num(linha[13])
 
         # Linha sem código = continuação do colaborador anterior
         if not codigo:
@@ -247,25 +323,22 @@ def processar_csv(arquivo_texto):
         if not codigo:
             continue
 
-        # Serializa para JSON (session não aceita date nem Decimal)
-        linhas.append({
-            'empresa':           empresa,
-            'codigo':            codigo,
-            'nome':              nome,
-            'cargo':             cargo,
-            'data_admissao':     data_admissao.isoformat() if data_admissao else None,
-            'inicio_aquisitivo': inicio_aq.isoformat(),
-            'fim_aquisitivo':    fim_aq.isoformat(),
-            'limite_ideal':      limite_ideal.isoformat()  if limite_ideal  else None,
-            'limite_maximo':     limite_maximo.isoformat() if limite_maximo else None,
-            'faltas':            str(faltas),
-            'dias_direito':      str(dias_direito),
-            'dias_gozo':         str(dias_gozo),
-            'dias_restantes':    str(dias_restantes),
-            'dias_programados':  str(dias_programados),
-        })
-
-    return linhas
+        yield LinhaCSV(
+            empresa           = empresa,
+            codigo            = codigo,
+            nome              = nome,
+            cargo             = cargo,
+            data_admissao     = data_admissao,
+            inicio_aquisitivo = inicio_aq,
+            fim_aquisitivo    = fim_aq,
+            limite_ideal      = limite_ideal,
+            limite_maximo     = limite_maximo,
+            faltas            = faltas,
+            dias_direito      = dias_direito,
+            dias_gozo         = dias_gozo,
+            dias_restantes    = dias_restantes,
+            dias_programados  = dias_programados,
+        )
 
 
 def analisar_importacao(linhas_csv):
@@ -275,14 +348,21 @@ def analisar_importacao(linhas_csv):
     """
     from provisao.models import Colaborador
 
-    codigos_csv   = set(l['codigo'] for l in linhas_csv)
-    codigos_banco = set(Colaborador.objects.filter(ativo=True).values_list('codigo', flat=True))
+    # Uma passada só pelo CSV: agrupa as linhas (períodos) de cada código
+    por_codigo = {}
+    for l in linhas_csv:
+        por_codigo.setdefault(l.codigo, []).append(l)
+    codigos_csv = por_codigo.keys()
+
+    # Uma única query: os ativos já servem para o diff e para listar os removidos
+    ativos        = Colaborador.objects.filter(ativo=True).in_bulk(field_name='codigo')
+    codigos_banco = ativos.keys()
 
     novos     = codigos_csv - codigos_banco
     removidos = codigos_banco - codigos_csv
 
-    novos_nomes    = {l['codigo']: l['nome'] for l in linhas_csv if l['codigo'] in novos}
-    removidos_objs = Colaborador.objects.filter(codigo__in=removidos)
+    novos_nomes    = {c: por_codigo[c][-1].nome for c in novos}
+    removidos_objs = sorted((ativos[c] for c in removidos), key=lambda c: c.nome)
 
     return {
         'novos':          novos,
@@ -290,4 +370,134 @@ def analisar_importacao(linhas_csv):
         'existentes':     codigos_csv & codigos_banco,
         'novos_nomes':    novos_nomes,
         'removidos_objs': removidos_objs,
-    }
\ No newline at end of file
+    }
+
+
+# Escrita da importação em lote
+_IMPORT_BATCH_SIZE = 500
+_IMPORT_STATEMENT_TIMEOUT = '5min'  # Postgres
+_PERIODO_CAMPOS_IMPORTADOS = [
+    'fim_aquisitivo', 'limite_ideal', 'limite_maximo', 'faltas',
+    'dias_direito', 'dias_gozo', 'dias_restantes', 'dias_programados',
+]
+
+
+def aplicar_importacao(linhas, adicionar_novos, remover_antigos):
+    """
+    Grava no banco as linhas (LinhaCSV) de uma importação confirmada.
+    Retorna o ImportacaoProvisao criado, com os totais de novos/removidos/atualizados.
+
+    Não depende de request/session: pode ser chamada pela view ou por um
+    worker/comando fora do ciclo HTTP, para importações grandes.
+    """
+    from django.db import connection, transaction
+    from provisao.cache_index import invalidar_index_apos_commit
+    from provisao.models import Colaborador, ImportacaoProvisao, PeriodoAquisitivo
+
+    novos_count = removidos_count = atualizados_count = 0
+
+    # Última linha de cada código vence (mesmo comportamento do antigo loop linha a linha)
+    por_codigo  = {l.codigo: l for l in linhas}
+    # Calculado uma vez e reaproveitado nas buscas e na inativação dos removidos
+    codigos_csv = frozenset(por_codigo)
+
+    with transaction.atomic():
+        # Só no Postgres, e só para esta transação (SET LOCAL):
+        # - synchronous_commit off: o COMMIT não espera o fsync do WAL. A
+        #   transação continua atômica; numa queda do servidor logo após o
+        #   commit, a importação inteira pode se perder (nunca pela metade).
+        # - statement_timeout: nenhuma query da importação passa de 5 minutos.
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL synchronous_commit = OFF")
+                cursor.execute(f"SET LOCAL statement_timeout = '{_IMPORT_STATEMENT_TIMEOUT}'")
+
+        # ── Colaboradores: 1 SELECT + 1 INSERT ... ON CONFLICT em lote ──────
+        existentes = Colaborador.objects.in_bulk(codigos_csv, field_name='codigo')
+
+        colaboradores = []
+        for codigo, l in por_codigo.items():
+            novo = codigo not in existentes
+            if novo and adicionar_novos:
+                novos_count += 1
+            colaboradores.append(Colaborador(
+                codigo=codigo,
+                nome=l.nome,
+                cargo=l.cargo,
+                empresa=l.empresa,
+                data_admissao=l.data_admissao,
+                # Novo sem autorização entra inativo e não recebe períodos
+                ativo=adicionar_novos or not novo,
+            ))
+
+        Colaborador.objects.bulk_create(
+            colaboradores,
+            batch_size=_IMPORT_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['codigo'],
+            update_fields=['nome', 'cargo', 'empresa', 'ativo'],
+        )
+        colab_por_codigo = Colaborador.objects.in_bulk(codigos_csv, field_name='codigo')
+
+        # ── Períodos: 1 INSERT ... ON CONFLICT DO UPDATE em lote ──────────────
+        # Das linhas existentes só as chaves importam (para a contagem de atualizados)
+        periodos_existentes = set(
+            PeriodoAquisitivo.objects.filter(
+                colaborador_id__in=[c.pk for c in existentes.values()]
+            ).values_list('colaborador_id', 'inicio_aquisitivo')
+        )
+        # Um objeto por chave: o mesmo período duas vezes no INSERT ... ON CONFLICT
+        # é erro no Postgres; a última linha vence, como no antigo loop
+        periodos = {}
+
+        for l in linhas:
+            colaborador = colab_por_codigo[l.codigo]
+            if not colaborador.ativo:
+                continue
+            if l.codigo in existentes:
+                atualizados_count += 1
+
+            chave = (colaborador.pk, l.inicio_aquisitivo)
+            if chave in periodos_existentes:
+                atualizados_count += 1
+
+            periodos[chave] = PeriodoAquisitivo(
+                colaborador=colaborador,
+                inicio_aquisitivo=l.inicio_aquisitivo,
+                fim_aquisitivo=l.fim_aquisitivo,
+                limite_ideal=l.limite_ideal,
+                limite_maximo=l.limite_maximo,
+                faltas=l.faltas,
+                dias_direito=l.dias_direito,
+                dias_gozo=l.dias_gozo,
+                dias_restantes=l.dias_restantes,
+                dias_programados=l.dias_programados,
+            )
+
+        PeriodoAquisitivo.objects.bulk_create(
+            periodos.values(),
+            batch_size=_IMPORT_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['colaborador', 'inicio_aquisitivo'],
+            update_fields=_PERIODO_CAMPOS_IMPORTADOS,
+        )
+
+        if remover_antigos:
+            # update() já devolve o número de linhas afetadas: dispensa o COUNT(*)
+            removidos_count = (
+                Colaborador.objects
+                .filter(ativo=True)
+                .exclude(codigo__in=codigos_csv)
+                .update(ativo=False)
+            )
+
+        # Bulk create/update não disparam sinais: a tabela do index é
+        # invalidada aqui, uma vez, depois do commit
+        invalidar_index_apos_commit()
+
+    return ImportacaoProvisao.objects.create(
+        total_linhas=len(linhas),
+        novos=novos_count,
+        removidos=removidos_count,
+        atualizados=atualizados_count,
+    )
@@ -1,37 +1,55 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse
 from django.views.decorators.http import require_POST
+from django.core.cache import cache, caches
 from django.db import transaction
-import json
+from django.db.models import Exists, OuterRef, Q, Sum
+import hashlib
+import io
+import uuid
+from collections import Counter, defaultdict
+from itertools import groupby
+from operator import itemgetter
 from decimal import Decimal, InvalidOperation
 from django.utils import timezone
 
+import orjson
 
-from .models import Colaborador, PeriodoAquisitivo, ParcelaFerias, ImportacaoProvisao
-from .utils import processar_csv, analisar_importacao
+from .models import (
+    Colaborador, PeriodoAquisitivo, ParcelaFerias, ImportacaoProvisao,
+    badge_do_status, parcela_para_dict,
+)
+from .cache_index import invalidar_index_apos_commit, versao_index
+from .utils import processar_csv, analisar_importacao, aplicar_importacao
 
+# Prévia da importação entre o upload e a confirmação (chave: token na session)
+_IMPORT_CACHE_KEY     = 'provisao:import:{}'
+_IMPORT_CACHE_TIMEOUT = 30 * 60  # segundos
 
-@login_required
-def index(request):
-    """Tela principal: tabela de colaboradores com seus períodos e parcelas de férias."""
-    colaboradores = (
-        Colaborador.objects
-        .filter(ativo=True)
-        .prefetch_related('periodos__parcelas')
-        .order_by('nome')
-    )
+# Dados da tabela do index por combinação de filtros (versionados, ver cache_index.py)
+_INDEX_CACHE_KEY     = 'provisao:index:{}'
+_INDEX_CACHE_TIMEOUT = 60  # segundos
+
+
+class OrjsonResponse(HttpResponse):
+    """Como o JsonResponse, mas serializado com orjson (bem mais rápido que o json da stdlib)."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(orjson.dumps(data), **kwargs)
 
-    # ── Filtros via GET ──────────────────────────────────────────────────────
-    busca          = request.GET.get('busca', '').strip()
-    filtro_empresa = request.GET.get('empresa', '').strip()
-    filtro_cargo   = request.GET.get('cargo', '').strip()
-    filtro_status  = request.GET.get('status', '').strip()  # 'danger' | 'warning' | 'ok'
+
+def _dados_tabela(hoje, busca, filtro_empresa, filtro_cargo, filtro_status):
+    """
+    Parte pesada do index: colaboradores filtrados com períodos/parcelas e as
+    métricas dos stat cards. O retorno é picklable, para ir ao cache.
+    """
+    colaboradores = Colaborador.objects.filter(ativo=True)
 
     if busca:
-        colaboradores = colaboradores.filter(nome__icontains=busca) | \
-                        colaboradores.filter(cargo__icontains=busca)
+        colaboradores = colaboradores.filter(Q(nome__icontains=busca) | Q(cargo__icontains=busca))
 
     if filtro_empresa:
         colaboradores = colaboradores.filter(empresa=filtro_empresa)
@@ -39,19 +57,92 @@ def index(request):
     if filtro_cargo:
         colaboradores = colaboradores.filter(cargo=filtro_cargo)
 
-    # Status é uma @property calculada no model — filtra em Python
+    # Colaborador com ao menos um período no status pedido — filtrado no banco
     if filtro_status:
-        colaboradores = [
-            c for c in colaboradores
-            if any(p.status_limite == filtro_status for p in c.periodos.all())
-        ]
+        colaboradores = colaboradores.filter(Exists(
+            PeriodoAquisitivo.objects
+            .com_status(hoje)
+            .filter(colaborador=OuterRef('pk'), status_calc=filtro_status)
+        ))
+
+    # A tabela lê tudo por chave, então as três queries abaixo usam .values():
+    # dicts simples, sem instanciar modelos (e mais leves para ir ao cache).
+    colaboradores_list = list(
+        colaboradores
+        .order_by('nome')
+        .values('id', 'codigo', 'nome', 'empresa', 'data_admissao', 'cargo')
+    )
+    por_id = {c['id']: c for c in colaboradores_list}
+
+    # ── Períodos: uma query, agrupada por colaborador com groupby ───────────
+    # O status de cada período vem calculado do banco em `status_calc`.
+    periodos_rows = (
+        PeriodoAquisitivo.objects
+        .filter(colaborador_id__in=list(por_id))
+        .com_status(hoje)
+        .order_by('colaborador_id', 'inicio_aquisitivo')
+        .values(
+            'id', 'colaborador_id', 'inicio_aquisitivo', 'fim_aquisitivo', 'limite_ideal',
+            'limite_maximo', 'dias_direito', 'dias_gozo', 'dias_restantes', 'status_calc',
+        )
+    )
+    for c in colaboradores_list:
+        c['periodos'] = []
+    periodos = []
+    for colaborador_id, grupo in groupby(periodos_rows, key=itemgetter('colaborador_id')):
+        por_id[colaborador_id]['periodos'] = lista = list(grupo)
+        periodos.extend(lista)
+
+    # ── Parcelas: uma query com .values(), já no formato do JSON do modal ────
+    # Cada período recebe a lista (badges da tabela) e o JSON pronto
+    # (data-parcelas), sem instanciar ParcelaFerias nem serializar no template.
+    parcelas_por_periodo = defaultdict(list)
+    for row in (
+        ParcelaFerias.objects
+        .filter(periodo_id__in=[p['id'] for p in periodos])
+        .values('periodo_id', 'id', 'mes_ferias', 'dias', 'observacao')
+    ):
+        parcelas_por_periodo[row.pop('periodo_id')].append(parcela_para_dict(**row))
+
+    for p in periodos:
+        p['parcelas_lista'] = parcelas_por_periodo.get(p['id'], [])
+        p['parcelas_json']  = orjson.dumps(p['parcelas_lista']).decode()
 
     # ── Métricas para os stat cards ──────────────────────────────────────────
-    # list() garante avaliação única do queryset (ou lista, se status filtrado)
-    colaboradores_list = list(colaboradores)
-    total    = len(colaboradores_list)
-    urgentes = sum(1 for c in colaboradores_list for p in c.periodos.all() if p.status_limite == 'danger')
-    atencao  = sum(1 for c in colaboradores_list for p in c.periodos.all() if p.status_limite == 'warning')
+    # Sem query extra: o total é o tamanho da lista já filtrada e a contagem por
+    # status sai do status_calc (calculado no banco) dos períodos já carregados
+    por_status = Counter(p['status_calc'] for p in periodos)
+
+    return {
+        'colaboradores': colaboradores_list,
+        'total':         len(colaboradores_list),
+        'urgentes':      por_status['danger'],
+        'atencao':       por_status['warning'],
+    }
+
+
+@login_required
+def index(request):
+    """Tela principal: tabela de colaboradores com seus períodos e parcelas de férias."""
+    hoje = timezone.now().date()
+
+    # ── Filtros via GET ──────────────────────────────────────────────────────
+    busca          = request.GET.get('busca', '').strip()
+    filtro_empresa = request.GET.get('empresa', '').strip()
+    filtro_cargo   = request.GET.get('cargo', '').strip()
+    filtro_status  = request.GET.get('status', '').strip()  # 'danger' | 'warning' | 'ok'
+
+    # ── Tabela e métricas: cache por filtro, invalidado a cada gravação ──────
+    # A versão (ver cache_index.py) muda sempre que algo exibido é gravado, então
+    # entradas antigas nunca são lidas; o timeout curto só limita o acúmulo.
+    filtros = (hoje, busca, filtro_empresa, filtro_cargo, filtro_status)
+    chave   = _INDEX_CACHE_KEY.format(hashlib.sha1(repr(filtros).encode()).hexdigest())
+    dados   = caches['index'].get_or_set(
+        chave,
+        lambda: _dados_tabela(*filtros),
+        timeout=_INDEX_CACHE_TIMEOUT,
+        version=versao_index(),
+    )
 
     # ── Opções para os selects de filtro ────────────────────────────────────
     # Sempre busca do banco inteiro (ativos) para os selects não perderem opções
@@ -76,16 +167,13 @@ def index(request):
     )
 
     return render(request, 'provisao/index.html', {
-        'colaboradores':      colaboradores_list,
+        **dados,
         'busca':              busca,
         'filtro_empresa':     filtro_empresa,
         'filtro_cargo':       filtro_cargo,
         'filtro_status':      filtro_status,
         'todas_empresas':     todas_empresas,
         'todos_cargos':       todos_cargos,
-        'total':              total,
-        'urgentes':           urgentes,
-        'atencao':            atencao,
         'ultima_importacao':  ultima_importacao,
         'importacao_desatualizada': importacao_desatualizada
     })
@@ -101,15 +189,17 @@ def importar(request):
     texto_csv = request.POST.get('texto_csv', '').strip()
 
     if arquivo:
-        conteudo = arquivo.read().decode('utf-8-sig', errors='replace')
+        # Decodifica sob demanda enquanto o csv.reader consome o upload
+        fonte = io.TextIOWrapper(arquivo.file, encoding='utf-8-sig', errors='replace', newline='')
     elif texto_csv:
-        conteudo = texto_csv
+        fonte = io.StringIO(texto_csv)
     else:
         messages.error(request, 'Selecione um arquivo ou cole o conteúdo do CSV.')
         return redirect('importar')
 
     try:
-        linhas = processar_csv(conteudo)
+        # Materializa aqui: a lista é usada na análise e guardada no cache
+        linhas = list(processar_csv(fonte))
     except Exception as e:
         messages.error(request, f'Erro ao processar o CSV: {e}')
         return redirect('importar')
@@ -119,7 +209,12 @@ def importar(request):
         return redirect('importar')
 
     analise = analisar_importacao(linhas)
-    request.session['linhas_csv'] = linhas
+
+    # A prévia vai para o cache (pickle aceita date) e a session guarda só a
+    # chave — assim o CSV não é re-serializado a cada request da session.
+    token = uuid.uuid4().hex
+    cache.set(_IMPORT_CACHE_KEY.format(token), linhas, _IMPORT_CACHE_TIMEOUT)
+    request.session['import_token'] = token
 
     return render(request, 'provisao/confirmar_importacao.html', {
         'linhas':           linhas,
@@ -136,7 +231,8 @@ def importar(request):
 @require_POST
 def confirmar_importacao(request):
     """Processa a importação confirmada pelo usuário."""
-    linhas = request.session.get('linhas_csv')
+    token  = request.session.get('import_token')
+    linhas = cache.get(_IMPORT_CACHE_KEY.format(token)) if token else None
     if not linhas:
         messages.error(request, 'Sessão expirada. Faça o upload novamente.')
         return redirect('importar')
@@ -144,95 +240,44 @@ def confirmar_importacao(request):
     adicionar_novos = request.POST.get('adicionar_novos') == '1'
     remover_antigos = request.POST.get('remover_antigos') == '1'
 
-    from datetime import date
-
-    def str_para_date(s):
-        if not s or s == 'None':
-            return None
-        return date.fromisoformat(s)
-
-    novos_count = removidos_count = atualizados_count = 0
-
-    with transaction.atomic():
-        for l in linhas:
-            inicio_aq = str_para_date(l['inicio_aquisitivo'])
-            fim_aq    = str_para_date(l['fim_aquisitivo'])
-
-            colaborador, criado = Colaborador.objects.get_or_create(
-                codigo=l['codigo'],
-                defaults={
-                    'nome':          l['nome'],
-                    'cargo':         l['cargo'],
-                    'empresa':       l['empresa'],
-                    'data_admissao': str_para_date(l['data_admissao']),
-                    'ativo':         True,
-                }
-            )
-
-            if criado:
-                if not adicionar_novos:
-                    colaborador.ativo = False
-                    colaborador.save()
-                    continue
-                novos_count += 1
-            else:
-                colaborador.nome    = l['nome']
-                colaborador.cargo   = l['cargo']
-                colaborador.empresa = l['empresa']
-                colaborador.ativo   = True
-                colaborador.save()
-                atualizados_count += 1
-
-            periodo, periodo_criado = PeriodoAquisitivo.objects.get_or_create(
-                colaborador=colaborador,
-                inicio_aquisitivo=inicio_aq,
-                defaults={
-                    'fim_aquisitivo':   fim_aq,
-                    'limite_ideal':     str_para_date(l['limite_ideal']),
-                    'limite_maximo':    str_para_date(l['limite_maximo']),
-                    'faltas':           Decimal(l['faltas']),
-                    'dias_direito':     Decimal(l['dias_direito']),
-                    'dias_gozo':        Decimal(l['dias_gozo']),
-                    'dias_restantes':   Decimal(l['dias_restantes']),
-                    'dias_programados': Decimal(l['dias_programados']),
-                }
-            )
+    importacao = aplicar_importacao(linhas, adicionar_novos, remover_antigos)
 
-            if not periodo_criado:
-                periodo.fim_aquisitivo   = fim_aq
-                periodo.limite_ideal     = str_para_date(l['limite_ideal'])
-                periodo.limite_maximo    = str_para_date(l['limite_maximo'])
-                periodo.faltas           = Decimal(l['faltas'])
-                periodo.dias_direito     = Decimal(l['dias_direito'])
-                periodo.dias_gozo        = Decimal(l['dias_gozo'])
-                periodo.dias_restantes   = Decimal(l['dias_restantes'])
-                periodo.dias_programados = Decimal(l['dias_programados'])
-                periodo.save()
-                atualizados_count += 1
-
-        if remover_antigos:
-            codigos_csv = set(l['codigo'] for l in linhas)
-            removidos   = Colaborador.objects.filter(ativo=True).exclude(codigo__in=codigos_csv)
-            removidos_count = removidos.count()
-            removidos.update(ativo=False)
-
-    ImportacaoProvisao.objects.create(
-        total_linhas=len(linhas),
-        novos=novos_count,
-        removidos=removidos_count,
-        atualizados=atualizados_count,
-    )
-
-    del request.session['linhas_csv']
+    cache.delete(_IMPORT_CACHE_KEY.format(token))
+    del request.session['import_token']
 
     messages.success(
         request,
         f'Importação concluída! '
-        f'{novos_count} adicionados, {removidos_count} inativados, {atualizados_count} atualizados.'
+        f'{importacao.novos} adicionados, {importacao.removidos} inativados, '
+        f'{importacao.atualizados} atualizados.'
     )
     return redirect('index')
 
 
+def _resposta_parcelas(periodo, parcelas_qs, dias_usados):
+    """
+    Resposta JSON comum a salvar_parcela/deletar_parcela.
+    Busca as parcelas uma vez, só com as colunas do to_dict, e calcula o status
+    a partir do total já somado no banco — sem percorrer as parcelas de novo.
+    """
+    # 'periodo' entra no only(): o related manager liga cada parcela ao período
+    # já carregado e, sem a FK, faria um SELECT extra por parcela
+    parcelas = (
+        parcelas_qs
+        .only('id', 'periodo', 'mes_ferias', 'dias', 'observacao')
+        .order_by('mes_ferias')
+    )
+    status = periodo.calcular_status(dias_agendados=dias_usados)
+    return OrjsonResponse({
+        'ok':           True,
+        'parcelas':     [p.to_dict() for p in parcelas],
+        'dias_usados':  float(dias_usados),
+        'dias_direito': float(periodo.dias_direito or 0),
+        'status_badge': list(badge_do_status(status)),
+        'status_limite': status,
+    })
+
+
 @login_required
 @require_POST
 def salvar_parcela(request):
@@ -242,12 +287,11 @@ def salvar_parcela(request):
     Retorna a lista atualizada de parcelas do período.
     """
     try:
-        data   = json.loads(request.body)
-        periodo = get_object_or_404(PeriodoAquisitivo, pk=data['periodo_id'])
+        data = orjson.loads(request.body)
 
         mes = data.get('mes_ferias', '').strip()
         if not mes or len(mes) != 7 or mes[4] != '-':
-            return JsonResponse({'ok': False, 'erro': 'Mês inválido. Use o formato YYYY-MM.'}, status=400)
+            return OrjsonResponse({'ok': False, 'erro': 'Mês inválido. Use o formato YYYY-MM.'}, status=400)
 
         dias_raw = data.get('dias', '').strip() if data.get('dias') else None
         dias     = None
@@ -255,37 +299,38 @@ def salvar_parcela(request):
             try:
                 dias = Decimal(dias_raw)
             except InvalidOperation:
-                return JsonResponse({'ok': False, 'erro': 'Dias inválido.'}, status=400)
-
-        if dias is not None and periodo.dias_direito:
-            ja_usados = sum(p.dias for p in periodo.parcelas.all() if p.dias is not None)
-            if ja_usados + dias > periodo.dias_direito:
-                disponiveis = periodo.dias_direito - ja_usados
-                return JsonResponse({
-                    'ok':   False,
-                    'erro': f'Limite excedido. Disponível: {int(disponiveis)}d de {int(periodo.dias_direito)}d ({int(ja_usados)}d já usados).'
-                }, status=400)
-
-        ParcelaFerias.objects.create(
-            periodo=periodo,
-            mes_ferias=mes,
-            dias=dias,
-            observacao=data.get('observacao', '').strip(),
-        )
+                return OrjsonResponse({'ok': False, 'erro': 'Dias inválido.'}, status=400)
+
+        # Trava a linha do período até o INSERT: duas requisições simultâneas
+        # não conseguem, juntas, passar do limite de dias. (O lock fica no
+        # período porque o Postgres não aceita FOR UPDATE com aggregate.)
+        with transaction.atomic():
+            periodo = get_object_or_404(
+                PeriodoAquisitivo.objects.select_for_update(),
+                pk=data['periodo_id'],
+            )
 
-        parcelas    = list(periodo.parcelas.all().order_by('mes_ferias'))
-        dias_usados = sum(p.dias for p in parcelas if p.dias is not None)
-        return JsonResponse({
-            'ok':           True,
-            'parcelas':     [p.to_dict() for p in parcelas],
-            'dias_usados':  float(dias_usados),
-            'dias_direito': float(periodo.dias_direito or 0),
-            'status_badge': list(periodo.status_badge),
-            'status_limite': periodo.status_limite,
-        })
+            ja_usados = periodo.parcelas.aggregate(total=Sum('dias'))['total'] or Decimal(0)
+            if dias is not None and periodo.dias_direito:
+                if ja_usados + dias > periodo.dias_direito:
+                    disponiveis = periodo.dias_direito - ja_usados
+                    return OrjsonResponse({
+                        'ok':   False,
+                        'erro': f'Limite excedido. Disponível: {int(disponiveis)}d de {int(periodo.dias_direito)}d ({int(ja_usados)}d já usados).'
+                    }, status=400)
+
+            ParcelaFerias.objects.create(
+                periodo=periodo,
+                mes_ferias=mes,
+                dias=dias,
+                observacao=data.get('observacao', '').strip(),
+            )
+            invalidar_index_apos_commit()
+
+        return _resposta_parcelas(periodo, periodo.parcelas.all(), ja_usados + (dias or 0))
 
     except Exception as e:
-        return JsonResponse({'ok': False, 'erro': str(e)}, status=500)
+        return OrjsonResponse({'ok': False, 'erro': str(e)}, status=500)
 
 
 @login_required
@@ -297,22 +342,18 @@ def deletar_parcela(request):
     Retorna a lista atualizada de parcelas do período.
     """
     try:
-        data       = json.loads(request.body)
-        parcela    = get_object_or_404(ParcelaFerias, pk=data['parcela_id'])
-        periodo_id = parcela.periodo_id
+        data       = orjson.loads(request.body)
+        # O período vem no mesmo SELECT da parcela e é reaproveitado após o delete
+        parcela    = get_object_or_404(
+            ParcelaFerias.objects.select_related('periodo'), pk=data['parcela_id']
+        )
+        periodo    = parcela.periodo
         parcela.delete()
+        invalidar_index_apos_commit()
 
-        periodo     = get_object_or_404(PeriodoAquisitivo, pk=periodo_id)
-        parcelas    = list(ParcelaFerias.objects.filter(periodo_id=periodo_id).order_by('mes_ferias'))
-        dias_usados = sum(p.dias for p in parcelas if p.dias is not None)
-        return JsonResponse({
-            'ok':           True,
-            'parcelas':     [p.to_dict() for p in parcelas],
-            'dias_usados':  float(dias_usados),
-            'dias_direito': float(periodo.dias_direito or 0),
-            'status_badge': list(periodo.status_badge),
-            'status_limite': periodo.status_limite,
-        })
+        restantes   = periodo.parcelas.all()
+        dias_usados = restantes.aggregate(total=Sum('dias'))['total'] or Decimal(0)
+        return _resposta_parcelas(periodo, restantes, dias_usados)
 
     except Exception as e:
-        return JsonResponse({'ok': False, 'erro': str(e)}, status=500)
\ No newline at end of file
+        return OrjsonResponse({'ok': False, 'erro': str(e)}, status=500)
\ No newline at end of file